@@ -4,7 +4,8 @@ import whisper
 import os
 from routes import routes_bp
 from auth import auth_bp, init_auth_db
-import sqlite3
+from metrics import init_metrics, register_gauge, timed_inference
+from transcript_store import TranscriptStore
 from transformers import pipeline
 from sentence_transformers import SentenceTransformer, util  # New import
 from datetime import timedelta
@@ -38,9 +39,22 @@ app.config.update(
 
 app.register_blueprint(auth_bp)  # Was: url_prefix='/api'
 app.register_blueprint(routes_bp)  # Was: url_prefix='/api'
+init_metrics(app)
 
 init_auth_db()
 
+# Transcripts are partitioned per day; set TRANSCRIPT_RETENTION_DAYS to drop old days
+retention_days = os.environ.get('TRANSCRIPT_RETENTION_DAYS')
+transcript_store = TranscriptStore(
+    os.environ.get('TRANSCRIPT_DIR', 'backend'),
+    retention_days=int(retention_days) if retention_days else None
+)
+register_gauge(
+    'radio_listener_backlog',
+    'Radio listener segments by stream and state (pending: ready but not dispatched, in_flight: transcribing)',
+    transcript_store.listener_backlog, label_names=('radio_stream', 'state')
+)
+
 # Load the Whisper model once at startup to avoid reloading on every request.
 # You can choose a model size: tiny, base, small, medium, large.
 MODEL_TYPE = "base"
@@ -62,7 +76,8 @@ def sentiment_analysis():
         return jsonify({"error": "Missing text parameter for input to ML model"}), 400
 
     # Run the sentiment analysis classifier
-    result = classifier(text)[0]
+    with timed_inference('classifier'):
+        result = classifier(text)[0]
     if not result:
         return jsonify({"error": "Failed to classify text"}), 500
     api_label = result.get("label", "")
@@ -72,8 +87,9 @@ def sentiment_analysis():
     candidate_labels = ["need supplies", "fleeing", "medical emergency", "advancing"]
 
     # Compute embeddings using the SentenceTransformer model
-    api_embedding = embedding_model.encode(api_label, convert_to_tensor=True)
-    candidate_embeddings = embedding_model.encode(candidate_labels, convert_to_tensor=True)
+    with timed_inference('embeddings'):
+        api_embedding = embedding_model.encode(api_label, convert_to_tensor=True)
+        candidate_embeddings = embedding_model.encode(candidate_labels, convert_to_tensor=True)
 
     # Compute cosine similarity scores and pick the best matching candidate
     cosine_scores = util.cos_sim(api_embedding, candidate_embeddings)
@@ -94,41 +110,50 @@ def sentiment_analysis():
 @cross_origin(origin="https://protest.morelos.dev")
 def query_transcriptions_db():
     """
-    SQL Query the transcriptions database for all transcriptions.
+    SQL Query the transcriptions database. Only the most recent, uncompressed
+    days are visible here; use /range_transcriptions and /radio_streams for
+    archived days.
     """ 
     # Retrieve the SQL query from the GET request parameters
     sql_query = request.args.get('query')
     if not sql_query:
         return jsonify({"error": "Missing query parameter"}), 400
 
-    # Define the path to the SQLite database file
-    # Adjust this path as necessary to point to your transcriptions.db
-    db_file = os.path.join("backend", "transcriptions.db")
-    
     try:
-        # Connect to the SQLite database
-        conn = sqlite3.connect(db_file)
-        cursor = conn.cursor()
+        # Connect to the recent transcription partitions, exposed as one table
+        with transcript_store.connect_recent() as conn:
+            cursor = conn.cursor()
 
-        # Execute the query (WARNING: In production, never execute unsanitized SQL)
-        cursor.execute(sql_query)
-        rows = cursor.fetchall()
+            # Execute the query (WARNING: In production, never execute unsanitized SQL)
+            cursor.execute(sql_query)
+            rows = cursor.fetchall()
 
-        # Retrieve column names for building dict results
-        col_names = [description[0] for description in cursor.description]
+            # Retrieve column names for building dict results
+            col_names = [description[0] for description in cursor.description]
 
         # Convert each row to a dictionary keyed by column name
         results = [dict(zip(col_names, row)) for row in rows]
 
-        # Close the connection
-        conn.close()
-
         # Return the results as JSON
         return jsonify(results)
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/radio_streams', methods=['GET'])
+@cross_origin(origin="https://protest.morelos.dev")
+def get_radio_streams():
+    """
+    List every radio stream that has transcriptions, including archived days.
+    """
+    try:
+        return jsonify(transcript_store.stream_names())
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# Rows returned by /range_transcriptions when no range or limit is given
+DEFAULT_TRANSCRIPT_LIMIT = 1000
+
 @app.route('/range_transcriptions', methods=['GET'])
 @cross_origin(origin="https://protest.morelos.dev")
 def get_transcriptions():
@@ -137,44 +162,25 @@ def get_transcriptions():
       - radio_stream
       - optional start_time (YYYY-MM-DDTHH:MM)
       - optional end_time   (YYYY-MM-DDTHH:MM)
+      - optional limit      (newest rows first; defaults to DEFAULT_TRANSCRIPT_LIMIT
+                             when neither bound is given)
     """
-    db_file = os.path.join("backend", "transcriptions.db")
-
     # Query parameters from the request
     radio_stream = request.args.get('radio_stream')
     start_time   = request.args.get('start_time')  # expects e.g. "2023-09-01T10:00"
     end_time     = request.args.get('end_time')    # expects e.g. "2023-09-02T09:59"
+    limit        = request.args.get('limit', type=int)
+    if limit is None and not start_time and not end_time:
+        # An unbounded query would otherwise read every archived day
+        limit = DEFAULT_TRANSCRIPT_LIMIT
 
     # Basic validation
     if not radio_stream:
         return jsonify({"error": "Missing radio_stream"}), 400
 
     try:
-        conn = sqlite3.connect(db_file)
-        cursor = conn.cursor()
-
-        # Build a base query
-        sql = "SELECT * FROM transcriptions WHERE radio_stream = ?"
-        params = [radio_stream]
-
-        # If start_time is provided, filter by start_time
-        if start_time:
-            sql += " AND start_time >= ?"
-            params.append(start_time)
-
-        # If end_time is provided, filter by end_time
-        if end_time:
-            sql += " AND start_time <= ?"
-            params.append(end_time)
-
-        sql += " ORDER BY id DESC"
-        # Finally, run
-        cursor.execute(sql, params)
-        rows = cursor.fetchall()
-        col_names = [desc[0] for desc in cursor.description]
-        conn.close()
-
-        results = [dict(zip(col_names, row)) for row in rows]
+        # Only the day partitions overlapping the range are read
+        results = transcript_store.range_query(radio_stream, start_time, end_time, limit)
         return jsonify(results)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -199,7 +205,8 @@ def transcribe_audio():
 
     # 3. Transcribe using Whisper
     #    Note: If your audio is not in English, set language="xx" or use detect_language=True
-    result = model.transcribe(temp_path)
+    with timed_inference('whisper'):
+        result = model.transcribe(temp_path)
     text = result["text"]
 
     # 4. Clean up temp file if desired
@@ -209,20 +216,15 @@ def transcribe_audio():
     return jsonify({"transcription": text})
 
 def init_transcription_db():
-    # Create database if it doesn't already exist
-    db_file = os.path.join("backend", "transcriptions.db")
-    conn = sqlite3.connect(db_file)
-    cursor = conn.cursor()
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS transcriptions (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        radio_stream TEXT,
-        start_time TEXT,
-        text TEXT
-        )
-    """)
-    conn.commit()
+    # Move any rows left in the old single-table database into day partitions,
+    # then keep compaction and retention running in the background
+    transcript_store.migrate_legacy()
+    transcript_store.start_maintenance()
 
 if __name__ == '__main__':
+    # With debug=True the reloader parent only watches files; start
+    # maintenance in the child process that actually serves requests
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        init_transcription_db()
     # Run on port 5000 so React (port 3000) can access it
     app.run(host='0.0.0.0', port=5001, debug=True)
@@ -0,0 +1,261 @@
+"""
+Load test for the map and transcription APIs.
+
+Simulates N marchers posting to /api/location (and occasionally /api/alert),
+M viewers polling /api/sessions and /api/alerts, and a stream of /transcribe
+and /sentiment_analysis calls. Reports throughput and p50/p95/p99 latency
+per endpoint.
+
+By default the Flask app is imported and driven in-process with stub models
+(see stub_models.py) so it runs in seconds in CI. Pass --url to hit a running
+server instead, and --real-models to load the real models in-process.
+
+USAGE: python backend/bench_load.py --marchers 50 --viewers 10 --duration 10
+       python backend/bench_load.py --url http://localhost:5001 --duration 30
+"""
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import wave
+from collections import defaultdict
+
+import numpy as np
+
+from binary_protocol import MIME_TYPE, encode_sessions
+
+CENTER = (42.3601, -71.0589)
+SENTENCES = [
+    "we need water at the north corner",
+    "police are advancing from the east!",
+    "someone is hurt near the fountain",
+    "everyone move back now!",
+]
+
+
+class InProcessClient:
+    """Adapts the Flask test client to the subset of the requests API we use."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def get(self, path, params=None, headers=None):
+        return self.client.get(path, query_string=params, headers=headers)
+
+    def post(self, path, json=None, data=None, files=None, headers=None):
+        if files:
+            data = {name: (io.BytesIO(body), filename) for name, (filename, body) in files.items()}
+            return self.client.post(path, data=data, content_type='multipart/form-data')
+        return self.client.post(path, json=json, data=data, headers=headers)
+
+    def delete(self, path):
+        return self.client.delete(path)
+
+
+class HttpClient:
+    def __init__(self, base_url):
+        import requests
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+
+    def get(self, path, params=None, headers=None):
+        return self.session.get(self.base_url + path, params=params, headers=headers)
+
+    def post(self, path, json=None, data=None, files=None, headers=None):
+        return self.session.post(self.base_url + path, json=json, data=data, files=files, headers=headers)
+
+    def delete(self, path):
+        return self.session.delete(self.base_url + path)
+
+
+def status_of(response):
+    return getattr(response, 'status_code', None)
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def call(self, name, fn):
+        start = time.perf_counter()
+        try:
+            response = fn()
+            ok = status_of(response) is not None and status_of(response) < 400
+        except Exception:
+            response, ok = None, False
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            self.latencies[name].append(elapsed)
+            if not ok:
+                self.errors[name] += 1
+        return response
+
+    def report(self, wall_time):
+        rows = []
+        for name in sorted(self.latencies):
+            samples = np.array(self.latencies[name]) * 1000
+            p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+            rows.append({
+                'endpoint': name,
+                'requests': len(samples),
+                'errors': self.errors[name],
+                'throughput': len(samples) / wall_time,
+                'p50_ms': p50,
+                'p95_ms': p95,
+                'p99_ms': p99,
+            })
+        return rows
+
+
+def silent_wav(seconds=1, rate=16000):
+    buf = io.BytesIO()
+    with wave.open(buf, 'wb') as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(b'\x00\x00' * rate * seconds)
+    return buf.getvalue()
+
+
+def marcher(client, recorder, stop, rng, interval, binary, alert_rate):
+    session_id = str(uuid.uuid4())
+    lat = CENTER[0] + rng.uniform(-0.005, 0.005)
+    lon = CENTER[1] + rng.uniform(-0.005, 0.005)
+    joined_at = time.strftime('%Y-%m-%dT%H:%M:%S')
+    while not stop.is_set():
+        lat += rng.uniform(-0.00005, 0.00005)
+        lon += rng.uniform(-0.00005, 0.00005)
+        body = {
+            'sessionId': session_id,
+            'position': [lat, lon],
+            'isTracking': True,
+            'joinedAt': joined_at,
+            'alert': None,
+        }
+        if binary:
+            payload = encode_sessions([dict(body, id=session_id, lastUpdate=0)])
+            recorder.call('POST /api/location', lambda: client.post(
+                '/api/location', data=payload, headers={'Content-Type': MIME_TYPE}))
+        else:
+            recorder.call('POST /api/location', lambda: client.post('/api/location', json=body))
+
+        if rng.random() < alert_rate:
+            recorder.call('POST /api/alert', lambda: client.post('/api/alert', json={
+                'markerId': str(uuid.uuid4()),
+                'position': [lat, lon],
+                'type': rng.choice(['water', 'medical', 'arrest', 'stayaway']),
+                'creatorId': session_id,
+                'createdAt': time.time() * 1000,
+            }))
+        stop.wait(interval)
+
+
+def viewer(client, recorder, stop, interval, binary):
+    headers = {'Accept': MIME_TYPE} if binary else None
+    while not stop.is_set():
+        recorder.call('GET /api/sessions', lambda: client.get('/api/sessions', headers=headers))
+        recorder.call('GET /api/alerts', lambda: client.get('/api/alerts'))
+        stop.wait(interval)
+
+
+def transcriber(client, recorder, stop, rng, interval, audio):
+    while not stop.is_set():
+        recorder.call('POST /transcribe', lambda: client.post(
+            '/transcribe', files={'audio_file': ('clip.wav', audio)}))
+        recorder.call('GET /sentiment_analysis', lambda: client.get(
+            '/sentiment_analysis', params={'text': rng.choice(SENTENCES)}))
+        stop.wait(interval)
+
+
+def make_client_factory(args):
+    if args.url:
+        return lambda: HttpClient(args.url)
+
+    if not args.real_models:
+        import stub_models
+        stub_models.install(args.stub_latency / 1000)
+    # Keep the benchmark away from the tracked transcriptions.db
+    os.environ.setdefault('TRANSCRIPT_DIR', tempfile.mkdtemp(prefix='bench_transcripts_'))
+    from app import app
+    return lambda: InProcessClient(app)
+
+
+def run(args):
+    new_client = make_client_factory(args)
+    recorder = Recorder()
+    stop = threading.Event()
+    audio = silent_wav()
+
+    threads = []
+    for i in range(args.marchers):
+        rng = random.Random(args.seed + i)
+        threads.append(threading.Thread(
+            target=marcher,
+            args=(new_client(), recorder, stop, rng, args.location_interval, args.binary, args.alert_rate)))
+    for _ in range(args.viewers):
+        threads.append(threading.Thread(
+            target=viewer,
+            args=(new_client(), recorder, stop, args.poll_interval, args.binary)))
+    # /transcribe writes to a fixed temp path, so keep the stream sequential
+    if args.transcribe:
+        rng = random.Random(args.seed - 1)
+        threads.append(threading.Thread(
+            target=transcriber,
+            args=(new_client(), recorder, stop, rng, args.transcribe_interval, audio)))
+
+    start = time.perf_counter()
+    for t in threads:
+        t.daemon = True
+        t.start()
+    time.sleep(args.duration)
+    stop.set()
+    for t in threads:
+        t.join()
+    wall_time = time.perf_counter() - start
+
+    return recorder.report(wall_time)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', help='Base URL of a running server; default runs the app in-process')
+    parser.add_argument('--real-models', action='store_true', help='Load the real models in-process')
+    parser.add_argument('--stub-latency', type=float, default=5, help='Stub model latency in ms')
+    parser.add_argument('--marchers', type=int, default=50)
+    parser.add_argument('--viewers', type=int, default=10)
+    parser.add_argument('--no-transcribe', dest='transcribe', action='store_false')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds to run')
+    parser.add_argument('--location-interval', type=float, default=1.0)
+    parser.add_argument('--poll-interval', type=float, default=1.0)
+    parser.add_argument('--transcribe-interval', type=float, default=0.5)
+    parser.add_argument('--alert-rate', type=float, default=0.02, help='Chance a location update also posts an alert')
+    parser.add_argument('--binary', action='store_true', help='Use the binary position protocol')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='Also write results to this file')
+    args = parser.parse_args()
+
+    rows = run(args)
+
+    print(f"{'endpoint':<26} {'reqs':>7} {'errs':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for row in rows:
+        print(f"{row['endpoint']:<26} {row['requests']:>7} {row['errors']:>5} {row['throughput']:>8.1f} "
+              f"{row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'args': vars(args), 'results': rows}, f, indent=2)
+
+    if any(row['errors'] for row in rows):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
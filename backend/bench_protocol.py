@@ -0,0 +1,69 @@
+"""
+Compare payload size and encode/decode latency of the binary position
+protocol against the JSON used by /api/sessions.
+
+USAGE: python backend/bench_protocol.py --sessions 50 500 5000 --repeat 20
+"""
+import argparse
+import json
+import time
+import uuid
+from datetime import datetime
+
+from binary_protocol import encode_sessions, decode_sessions
+from routes import generate_random_coordinates
+
+
+def make_sessions(count):
+    """Build session dicts shaped like the /api/sessions JSON response."""
+    now = time.time() * 1000
+    positions = generate_random_coordinates((42.3601, -71.0589), 0, 2000, count)
+    return [
+        {
+            'id': str(uuid.uuid4()),
+            'position': pos,
+            'lastUpdate': now - (i * 37) % 30000,
+            'joinedAt': datetime.now().isoformat(),
+            'ip': f'10.0.{i // 256 % 256}.{i % 256}',
+            'isDummy': i % 4 == 0,
+            'alert': {'type': 'water', 'expiresAt': now + 30000} if i % 10 == 0 else None,
+            'creatorId': 'creator-1' if i % 4 == 0 else None,
+        }
+        for i, pos in enumerate(positions)
+    ]
+
+
+def best_of(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sessions', type=int, nargs='+', default=[50, 500, 5000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'sessions':>8} {'json B':>10} {'bin B':>10} {'ratio':>6} "
+          f"{'json enc':>9} {'bin enc':>9} {'json dec':>9} {'bin dec':>9}  (ms)")
+    for count in args.sessions:
+        sessions = make_sessions(count)
+        json_payload = json.dumps(sessions).encode('utf-8')
+        bin_payload = encode_sessions(sessions, count)
+
+        json_enc = best_of(lambda: json.dumps(sessions).encode('utf-8'), args.repeat)
+        bin_enc = best_of(lambda: encode_sessions(sessions, count), args.repeat)
+        json_dec = best_of(lambda: json.loads(json_payload), args.repeat)
+        bin_dec = best_of(lambda: decode_sessions(bin_payload), args.repeat)
+
+        print(f"{count:>8} {len(json_payload):>10} {len(bin_payload):>10} "
+              f"{len(json_payload) / len(bin_payload):>6.1f} "
+              f"{json_enc:>9.2f} {bin_enc:>9.2f} {json_dec:>9.2f} {bin_dec:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,256 @@
+"""
+Compact binary encoding for location updates and session listings.
+
+The JSON payloads for /api/location and /api/sessions repeat every key for
+every marcher and carry coordinates as floats and joinedAt as ISO strings.
+On congested cellular links that overhead dominates, so clients may opt in
+to this format instead:
+
+  - POST /api/location with Content-Type: application/x-protest-positions
+  - GET  /api/sessions with Accept: application/x-protest-positions
+
+Layout (all integers little-endian):
+
+  header   magic b"PP", version u8, reserved u8, count u32,
+           base_ms i64, active_connections u32
+  strings  n u32, n x u16 byte lengths, concatenated UTF-8 bytes
+  records  count x RECORD_DTYPE (packed, see below)
+
+Records are sorted by lastUpdate. Positions are quantized to 1e-7 degrees
+(~1 cm) in int32, lastUpdate is stored as the u32 millisecond delta from the
+previous record (the first from base_ms), and joinedAt as i32 seconds
+relative to base_ms. Ids, creator ids, ips and alerts are interned into the
+string table and referenced by index (-1 means missing). Object alerts are
+stored as their compact JSON encoding and marked with FLAG_ALERT_JSON.
+"""
+import json
+import struct
+from datetime import datetime, timezone
+
+import numpy as np
+
+MIME_TYPE = 'application/x-protest-positions'
+MAGIC = b'PP'
+VERSION = 1
+
+COORD_SCALE = 1e7
+
+FLAG_DUMMY = 0x01
+FLAG_TRACKING = 0x02
+FLAG_ALERT_JSON = 0x04
+
+HEADER = struct.Struct('<2sBBIqI')
+
+RECORD_DTYPE = np.dtype([
+    ('id', '<i4'),
+    ('lat', '<i4'),
+    ('lon', '<i4'),
+    ('ts_delta', '<u4'),
+    ('joined', '<i4'),
+    ('flags', 'u1'),
+    ('alert', '<i4'),
+    ('creator', '<i4'),
+    ('ip', '<i4'),
+])
+
+
+class ProtocolError(ValueError):
+    """Raised when a binary payload is malformed."""
+
+
+def accepts_binary(req):
+    """
+    True if the request names the binary format and ranks it above JSON.
+    Wildcards such as the browser default */* keep getting JSON.
+    """
+    accept = req.accept_mimetypes
+    return accept[MIME_TYPE] > accept['application/json']
+
+
+def is_binary(req):
+    """True if the request body is in the binary format"""
+    return req.mimetype == MIME_TYPE
+
+
+def _to_epoch_ms(value, default):
+    """
+    Epoch milliseconds for a joinedAt value. A missing joinedAt falls back to
+    default (the record's lastUpdate); an unparseable one raises ProtocolError.
+    """
+    if value is None:
+        return default
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        # JS toISOString() ends in 'Z', which fromisoformat only accepts from 3.11
+        if value.endswith('Z'):
+            value = value[:-1] + '+00:00'
+        try:
+            return datetime.fromisoformat(value).timestamp() * 1000
+        except ValueError as e:
+            raise ProtocolError(f'Invalid joinedAt: {e}') from e
+    raise ProtocolError(f'Invalid joinedAt type: {type(value).__name__}')
+
+
+def _check_range(values, dtype, what):
+    info = np.iinfo(dtype)
+    if len(values) and (values.min() < info.min or values.max() > info.max):
+        raise ProtocolError(f'{what} out of range for binary encoding')
+
+
+def _from_epoch_ms(ms):
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc).isoformat(timespec='milliseconds')
+
+
+class _StringTable:
+    def __init__(self):
+        self.index = {}
+        self.values = []
+
+    def intern(self, value):
+        if value is None:
+            return -1
+        if not isinstance(value, str):
+            value = json.dumps(value, separators=(',', ':'), sort_keys=True)
+        idx = self.index.get(value)
+        if idx is None:
+            idx = len(self.values)
+            self.index[value] = idx
+            self.values.append(value)
+        return idx
+
+    def encode(self):
+        raw = [v.encode('utf-8') for v in self.values]
+        if any(len(r) > 0xFFFF for r in raw):
+            raise ProtocolError('String too long for binary encoding')
+        lengths = np.fromiter((len(r) for r in raw), dtype='<u2', count=len(raw))
+        return struct.pack('<I', len(raw)) + lengths.tobytes() + b''.join(raw)
+
+
+def encode_sessions(sessions, active_connections=0):
+    """
+    Encode a list of session dicts (as returned by /api/sessions) into the
+    binary format. Accepts both 'lastUpdate' and 'timestamp' keys. Raises
+    ProtocolError if a value does not fit the format, e.g. records spanning
+    more than ~49 days; callers should then fall back to JSON.
+    """
+    count = len(sessions)
+    strings = _StringTable()
+
+    positions = np.array([s['position'] for s in sessions], dtype=np.float64).reshape(count, 2)
+    timestamps = np.array(
+        [s.get('lastUpdate', s.get('timestamp', 0)) for s in sessions], dtype=np.float64
+    )
+    joined = np.array(
+        [_to_epoch_ms(s.get('joinedAt'), ts) for s, ts in zip(sessions, timestamps)],
+        dtype=np.float64
+    )
+
+    order = np.argsort(timestamps, kind='stable')
+    timestamps = np.rint(timestamps[order]).astype(np.int64)
+    base_ms = int(timestamps[0]) if count else 0
+
+    records = np.zeros(count, dtype=RECORD_DTYPE)
+    quantized = np.rint(positions[order] * COORD_SCALE)
+    if count and np.abs(quantized).max() > np.iinfo(np.int32).max:
+        raise ProtocolError('Coordinates out of range')
+    records['lat'] = quantized[:, 0]
+    records['lon'] = quantized[:, 1]
+    ts_delta = np.diff(timestamps, prepend=base_ms)
+    joined_delta = np.rint((joined[order] - base_ms) / 1000)
+    _check_range(ts_delta, np.uint32, 'lastUpdate gap')
+    _check_range(joined_delta, np.int32, 'joinedAt')
+    records['ts_delta'] = ts_delta
+    records['joined'] = joined_delta
+
+    ordered = [sessions[i] for i in order]
+    records['flags'] = [
+        (FLAG_DUMMY if s.get('isDummy') else 0)
+        | (FLAG_TRACKING if s.get('isTracking') else 0)
+        | (FLAG_ALERT_JSON if s.get('alert') is not None and not isinstance(s.get('alert'), str) else 0)
+        for s in ordered
+    ]
+    records['id'] = [strings.intern(s.get('id', s.get('sessionId'))) for s in ordered]
+    records['alert'] = [strings.intern(s.get('alert')) for s in ordered]
+    records['creator'] = [strings.intern(s.get('creatorId')) for s in ordered]
+    records['ip'] = [strings.intern(s.get('ip')) for s in ordered]
+
+    header = HEADER.pack(MAGIC, VERSION, 0, count, base_ms, active_connections)
+    return header + strings.encode() + records.tobytes()
+
+
+def decode_sessions(payload):
+    """
+    Decode a binary payload into (sessions, active_connections), where
+    sessions is a list of dicts shaped like the JSON /api/sessions entries.
+    """
+    if len(payload) < HEADER.size:
+        raise ProtocolError('Payload too short')
+    magic, version, _, count, base_ms, active_connections = HEADER.unpack_from(payload)
+    if magic != MAGIC or version != VERSION:
+        raise ProtocolError('Unsupported payload version')
+    offset = HEADER.size
+
+    try:
+        (n_strings,) = struct.unpack_from('<I', payload, offset)
+        offset += 4
+        lengths = np.frombuffer(payload, dtype='<u2', count=n_strings, offset=offset)
+        offset += lengths.nbytes
+        ends = np.cumsum(lengths, dtype=np.int64) + offset
+        starts = ends - lengths
+        strings = [payload[a:b].decode('utf-8') for a, b in zip(starts.tolist(), ends.tolist())]
+        offset = int(ends[-1]) if n_strings else offset
+        records = np.frombuffer(payload, dtype=RECORD_DTYPE, count=count, offset=offset)
+    except (struct.error, ValueError, UnicodeDecodeError) as e:
+        raise ProtocolError(f'Malformed payload: {e}') from e
+
+    refs = np.stack([records['id'], records['alert'], records['creator'], records['ip']])
+    if refs.size and (refs.max() >= len(strings) or refs.min() < -1):
+        raise ProtocolError('String reference out of range')
+
+    positions = np.stack([records['lat'], records['lon']], axis=1) / COORD_SCALE
+    timestamps = base_ms + np.cumsum(records['ts_delta'], dtype=np.int64)
+    joined = base_ms + records['joined'].astype(np.int64) * 1000
+
+    def lookup(idx):
+        return strings[idx] if idx >= 0 else None
+
+    sessions = []
+    for rec, pos, ts, jn in zip(records.tolist(), positions.tolist(), timestamps.tolist(), joined.tolist()):
+        session_id, _, _, _, _, flags, alert, creator, ip = rec
+        alert = lookup(alert)
+        if alert is not None and flags & FLAG_ALERT_JSON:
+            try:
+                alert = json.loads(alert)
+            except ValueError as e:
+                raise ProtocolError(f'Malformed alert: {e}') from e
+        sessions.append({
+            'id': lookup(session_id),
+            'position': pos,
+            'lastUpdate': ts,
+            'joinedAt': _from_epoch_ms(jn),
+            'ip': lookup(ip),
+            'isDummy': bool(flags & FLAG_DUMMY),
+            'isTracking': bool(flags & FLAG_TRACKING),
+            'alert': alert,
+            'creatorId': lookup(creator),
+        })
+    return sessions, active_connections
+
+
+def decode_location(payload):
+    """
+    Decode a single-record binary /api/location body into the same dict the
+    JSON endpoint receives.
+    """
+    sessions, _ = decode_sessions(payload)
+    if len(sessions) != 1:
+        raise ProtocolError('Expected exactly one location record')
+    s = sessions[0]
+    return {
+        'sessionId': s['id'],
+        'position': s['position'],
+        'isTracking': s['isTracking'],
+        'joinedAt': s['joinedAt'],
+        'alert': s['alert'],
+    }
@@ -0,0 +1,327 @@
+"""
+In-process metrics for the Flask backend, exposed in Prometheus text format.
+
+Records per-endpoint request latency, wait/hold times for the shared locks in
+routes.py, model inference timings, queue depths (requests in flight and
+threads waiting on each lock) and a few gauges (session and alert counts).
+A sampling profiler can be switched on with PROFILER_ENABLED=1 or, for a
+logged-in user, POST /metrics/profiler?enabled=1, and read back from
+GET /metrics/profile as collapsed stacks (flamegraph.pl / speedscope input).
+"""
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+
+from flask import Blueprint, Response, g, request, jsonify
+
+from auth import login_required
+
+metrics_bp = Blueprint('metrics', __name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+LOCK_BUCKETS = (0.00001, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        idx = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][idx] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            snapshot = [(k, list(s[0]), s[1], s[2]) for k, s in self.series.items()]
+        for key, counts, total, count in snapshot:
+            cumulative = 0
+            for bound, n in zip(self.buckets + ('+Inf',), counts):
+                cumulative += n
+                lines.append(f'{self.name}_bucket{_format_labels(key, [("le", bound)])} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(key)} {total}')
+            lines.append(f'{self.name}_count{_format_labels(key)} {count}')
+        return lines
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.values = defaultdict(float)
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        with self.lock:
+            self.values[_label_key(labels)] += amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        with self.lock:
+            snapshot = list(self.values.items())
+        lines.extend(f'{self.name}{_format_labels(key)} {value}' for key, value in snapshot)
+        return lines
+
+
+class LevelGauge(Counter):
+    """Gauge moved up and down as work enters and leaves a queue."""
+    kind = 'gauge'
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Gauge:
+    """
+    Gauge whose value is read from a callback at scrape time. If label_names
+    is given, the callback returns {label_values_tuple: value}.
+    """
+
+    def __init__(self, name, help_text, fn, label_names=()):
+        self.name = name
+        self.help = help_text
+        self.fn = fn
+        self.label_names = tuple(label_names)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} gauge']
+        if not self.label_names:
+            lines.append(f'{self.name} {self.fn()}')
+            return lines
+        for values, value in self.fn().items():
+            lines.append(f'{self.name}{_format_labels(zip(self.label_names, values))} {value}')
+        return lines
+
+
+request_latency = Histogram(
+    'http_request_duration_seconds', 'Request latency by endpoint', LATENCY_BUCKETS
+)
+request_errors = Counter('http_request_errors_total', 'Exceptions raised while handling a request, by endpoint')
+lock_wait = Histogram('lock_wait_seconds', 'Time spent waiting to acquire a lock', LOCK_BUCKETS)
+lock_hold = Histogram('lock_hold_seconds', 'Time a lock was held', LOCK_BUCKETS)
+inference_latency = Histogram(
+    'model_inference_seconds', 'Model inference latency by model', LATENCY_BUCKETS
+)
+requests_in_flight = LevelGauge('http_requests_in_flight', 'Requests currently being handled')
+lock_waiters = LevelGauge('lock_waiters', 'Threads currently waiting to acquire a lock')
+
+_collectors = [
+    request_latency, request_errors, lock_wait, lock_hold, inference_latency,
+    requests_in_flight, lock_waiters,
+]
+
+
+def register_gauge(name, help_text, fn, label_names=()):
+    _collectors.append(Gauge(name, help_text, fn, label_names))
+
+
+def render_prometheus():
+    lines = []
+    for collector in _collectors:
+        lines.extend(collector.render())
+    return '\n'.join(lines) + '\n'
+
+
+@contextmanager
+def timed_inference(model):
+    """Time a block of model inference, e.g. `with timed_inference('whisper'):`"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        inference_latency.observe(time.perf_counter() - start, model=model)
+
+
+class InstrumentedLock:
+    """
+    Wraps a Lock/RLock and records how long callers wait for it and how long
+    they hold it. Re-entrant acquisitions of an RLock are timed only at the
+    outermost level so hold times are not double counted.
+    """
+
+    def __init__(self, lock, name):
+        self._lock = lock
+        self.name = name
+        self._local = threading.local()
+
+    def acquire(self, blocking=True, timeout=-1):
+        depth = getattr(self._local, 'depth', 0)
+        start = time.perf_counter()
+        if depth == 0:
+            lock_waiters.inc(lock=self.name)
+            try:
+                acquired = self._lock.acquire(blocking, timeout)
+            finally:
+                lock_waiters.dec(lock=self.name)
+        else:
+            acquired = self._lock.acquire(blocking, timeout)
+        if acquired:
+            if depth == 0:
+                now = time.perf_counter()
+                lock_wait.observe(now - start, lock=self.name)
+                self._local.acquired_at = now
+            self._local.depth = depth + 1
+        return acquired
+
+    def release(self):
+        depth = self._local.depth - 1
+        self._local.depth = depth
+        if depth == 0:
+            lock_hold.observe(time.perf_counter() - self._local.acquired_at, lock=self.name)
+        self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class SamplingProfiler:
+    """
+    Periodically samples the stacks of all threads and aggregates them as
+    collapsed stacks. Sampling runs on a daemon thread and only while enabled.
+    """
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.samples = defaultdict(int)
+        self.lock = threading.Lock()
+        self._stop = None
+        self._thread = None
+
+    @property
+    def enabled(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.enabled:
+            return
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(self._stop,), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._stop is not None:
+            self._stop.set()
+        self._thread = None
+
+    def reset(self):
+        with self.lock:
+            self.samples.clear()
+
+    def _run(self, stop):
+        own_ident = threading.get_ident()
+        while not stop.wait(self.interval):
+            frames = sys._current_frames()
+            with self.lock:
+                for ident, frame in frames.items():
+                    if ident == own_ident:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        code = frame.f_code
+                        stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+                        frame = frame.f_back
+                    self.samples[';'.join(reversed(stack))] += 1
+
+    def collapsed(self):
+        with self.lock:
+            snapshot = sorted(self.samples.items(), key=lambda item: -item[1])
+        return '\n'.join(f'{stack} {count}' for stack, count in snapshot) + '\n'
+
+
+profiler = SamplingProfiler(float(os.environ.get('PROFILER_INTERVAL', '0.01')))
+
+
+def init_metrics(app):
+    """Register request timing hooks and the /metrics routes on the app."""
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_start = time.perf_counter()
+        g.metrics_in_flight = True
+        requests_in_flight.inc()
+
+    @app.after_request
+    def _record_latency(response):
+        start = g.pop('metrics_start', None)
+        if start is not None:
+            request_latency.observe(
+                time.perf_counter() - start,
+                endpoint=request.endpoint or 'unknown',
+                method=request.method,
+                status=response.status_code
+            )
+        return response
+
+    @app.teardown_request
+    def _record_error(exc):
+        if g.pop('metrics_in_flight', False):
+            requests_in_flight.dec()
+        if exc is not None:
+            request_errors.inc(endpoint=request.endpoint or 'unknown')
+
+    app.register_blueprint(metrics_bp)
+
+    if os.environ.get('PROFILER_ENABLED') == '1':
+        profiler.start()
+
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+
+@metrics_bp.route('/metrics/profiler', methods=['GET', 'POST'])
+@login_required
+def toggle_profiler():
+    """Enable/disable the sampling profiler with ?enabled=1|0, or ?reset=1 to clear samples"""
+    if request.method == 'POST':
+        enabled = request.args.get('enabled')
+        if enabled == '1':
+            profiler.start()
+        elif enabled == '0':
+            profiler.stop()
+        if request.args.get('reset') == '1':
+            profiler.reset()
+    return jsonify({'enabled': profiler.enabled, 'interval': profiler.interval})
+
+
+@metrics_bp.route('/metrics/profile', methods=['GET'])
+@login_required
+def get_profile():
+    return Response(profiler.collapsed(), mimetype='text/plain')
@@ -1,4 +1,4 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, current_app, request, jsonify
 from datetime import datetime, timedelta
 import threading
 import time
@@ -7,6 +7,10 @@ import random
 import numpy as np
 from collections import defaultdict
 from functools import lru_cache
+from binary_protocol import (
+    MIME_TYPE, ProtocolError, accepts_binary, is_binary, decode_location, encode_sessions
+)
+from metrics import InstrumentedLock, register_gauge, request_errors
 
 
 routes_bp = Blueprint('routes', __name__)
@@ -16,11 +20,14 @@ sessions = {}
 session_lock = threading.Lock()
 
 alert_markers = {}
-alert_lock = threading.Lock()
+alert_lock = InstrumentedLock(threading.Lock(), 'alert_lock')
 
 # Use a more efficient data structure
 active_sessions = defaultdict(dict)
-session_lock = threading.RLock()  # Use RLock instead of Lock
+session_lock = InstrumentedLock(threading.RLock(), 'session_lock')  # Use RLock instead of Lock
+
+register_gauge('active_sessions', 'Entries in active_sessions, including dummies', lambda: len(active_sessions))
+register_gauge('alert_markers', 'Entries in alert_markers, including expired', lambda: len(alert_markers))
 
 # Cache the active connection count for 1 second
 @lru_cache(maxsize=1)
@@ -93,7 +100,13 @@ def get_active_connections():
 
 @routes_bp.route('/api/location', methods=['POST'])
 def update_location():
-    data = request.json
+    if is_binary(request):
+        try:
+            data = decode_location(request.get_data())
+        except ProtocolError as e:
+            return jsonify({'error': str(e)}), 400
+    else:
+        data = request.json
     session_id = data.get('sessionId')
     position = data.get('position')
     is_tracking = data.get('isTracking', False)
@@ -204,11 +217,24 @@ def get_sessions():
                 for session in active_sessions.values()
                 if session.get('isDummy', False)
             ]
-            
-            return jsonify(all_sessions)
+
+            response = None
+            if accepts_binary(request):
+                try:
+                    response = Response(
+                        encode_sessions(all_sessions, count_active_connections()),
+                        mimetype=MIME_TYPE
+                    )
+                except ProtocolError as e:
+                    current_app.logger.warning("Falling back to JSON for /api/sessions: %s", e)
+            if response is None:
+                response = jsonify(all_sessions)
+            response.vary.add('Accept')
+            return response
             
     except Exception as e:
-        print(f"Error in get_sessions: {str(e)}")
+        current_app.logger.exception("Error in get_sessions")
+        request_errors.inc(endpoint=request.endpoint)
         return jsonify({'error': str(e)}), 500
         
 @routes_bp.route('/api/alert', methods=['POST'])
@@ -0,0 +1,82 @@
+"""
+Lightweight stand-ins for whisper, transformers and sentence_transformers.
+
+install() registers stub modules in sys.modules so that app.py (and
+radio_listener.py) can be imported without downloading or loading any model
+weights. Each stub sleeps for a configurable time to mimic inference cost,
+which keeps benchmarks fast and deterministic in CI.
+"""
+import hashlib
+import sys
+import time
+import types
+
+import numpy as np
+
+
+class StubWhisperModel:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def transcribe(self, path, **kwargs):
+        time.sleep(self.latency)
+        return {
+            "text": " stub transcription",
+            "segments": [
+                {"start": 0.0, "end": 5.0, "text": " stub transcription"},
+            ],
+        }
+
+
+class StubClassifier:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def __call__(self, text):
+        time.sleep(self.latency)
+        return [{"label": "toxic" if "!" in text else "non-toxic", "score": 0.9}]
+
+
+class StubSentenceTransformer:
+    dim = 16
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def _vector(self, text):
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        return np.frombuffer(digest[:self.dim], dtype=np.uint8).astype(np.float32)
+
+    def encode(self, texts, **kwargs):
+        time.sleep(self.latency)
+        if isinstance(texts, str):
+            return self._vector(texts)
+        return np.stack([self._vector(t) for t in texts])
+
+
+def _cos_sim(a, b):
+    a = np.atleast_2d(a)
+    b = np.atleast_2d(b)
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return a @ b.T
+
+
+def install(latency=0.0):
+    """
+    Replace the model libraries with stubs. Must be called before importing
+    app.py or radio_listener.py. latency is the per-call sleep in seconds.
+    """
+    whisper = types.ModuleType("whisper")
+    whisper.load_model = lambda *args, **kwargs: StubWhisperModel(latency)
+
+    transformers = types.ModuleType("transformers")
+    transformers.pipeline = lambda *args, **kwargs: StubClassifier(latency)
+
+    sentence_transformers = types.ModuleType("sentence_transformers")
+    sentence_transformers.SentenceTransformer = lambda *args, **kwargs: StubSentenceTransformer(latency)
+    sentence_transformers.util = types.SimpleNamespace(cos_sim=_cos_sim)
+
+    sys.modules["whisper"] = whisper
+    sys.modules["transformers"] = transformers
+    sys.modules["sentence_transformers"] = sentence_transformers
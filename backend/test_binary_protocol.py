@@ -0,0 +1,137 @@
+import struct
+
+import pytest
+from werkzeug.test import EnvironBuilder
+from werkzeug.wrappers import Request
+
+from binary_protocol import (
+    FLAG_ALERT_JSON, HEADER, MAGIC, MIME_TYPE, RECORD_DTYPE, VERSION, ProtocolError,
+    accepts_binary, decode_location, decode_sessions, encode_sessions
+)
+
+NOW = 1700000000000
+
+
+def make_session(**overrides):
+    session = {
+        'id': 'session-1',
+        'position': [42.3601234, -71.0589876],
+        'lastUpdate': NOW,
+        'joinedAt': '2023-11-14T22:13:20.000Z',
+        'ip': '10.0.0.1',
+        'isDummy': False,
+        'isTracking': True,
+        'alert': None,
+        'creatorId': None,
+    }
+    session.update(overrides)
+    return session
+
+
+def test_round_trip():
+    sessions = [
+        make_session(),
+        make_session(id='dummy-1', lastUpdate=NOW - 5000, isDummy=True, isTracking=False,
+                     creatorId='creator', ip='0.0.0.0', alert={'type': 'water', 'expiresAt': NOW}),
+    ]
+    decoded, active = decode_sessions(encode_sessions(sessions, 7))
+
+    assert active == 7
+    # Records come back sorted by lastUpdate
+    dummy, real = decoded
+    assert real['id'] == 'session-1'
+    assert real['lastUpdate'] == NOW
+    assert real['position'] == pytest.approx([42.3601234, -71.0589876], abs=1e-7)
+    assert real['joinedAt'] == '2023-11-14T22:13:20.000+00:00'
+    assert real['isTracking'] and not real['isDummy']
+    assert dummy['lastUpdate'] == NOW - 5000
+    assert dummy['alert'] == {'type': 'water', 'expiresAt': NOW}
+    assert dummy['creatorId'] == 'creator'
+    assert dummy['isDummy']
+
+
+def test_ids_are_interned():
+    sessions = [make_session(id=f's{i}', ip='10.0.0.1', creatorId='c') for i in range(10)]
+    payload = encode_sessions(sessions)
+    assert payload.count(b'10.0.0.1') == 1
+
+
+def test_string_alert_is_not_parsed_as_json():
+    decoded, _ = decode_sessions(encode_sessions([make_session(alert='{oops')]))
+    assert decoded[0]['alert'] == '{oops'
+
+
+def test_missing_joined_at_falls_back_to_last_update():
+    decoded, _ = decode_sessions(encode_sessions([make_session(joinedAt=None)]))
+    assert decoded[0]['joinedAt'] == '2023-11-14T22:13:20.000+00:00'
+
+
+def test_invalid_joined_at_is_rejected():
+    with pytest.raises(ProtocolError):
+        encode_sessions([make_session(joinedAt='yesterday')])
+
+
+def test_large_last_update_gap_is_rejected():
+    stale = make_session(id='old', lastUpdate=NOW - 60 * 86400 * 1000)
+    with pytest.raises(ProtocolError):
+        encode_sessions([stale, make_session()])
+
+
+def test_joined_at_out_of_range_is_rejected():
+    with pytest.raises(ProtocolError):
+        encode_sessions([make_session(joinedAt='1900-01-01T00:00:00Z')])
+
+
+def test_decode_location():
+    data = decode_location(encode_sessions([make_session(alert={'type': 'medical'})]))
+    assert data['sessionId'] == 'session-1'
+    assert data['isTracking'] is True
+    assert data['alert'] == {'type': 'medical'}
+
+
+def test_decode_location_requires_one_record():
+    with pytest.raises(ProtocolError):
+        decode_location(encode_sessions([make_session(), make_session(id='s2')]))
+
+
+@pytest.mark.parametrize('payload', [
+    b'',
+    b'XX' + bytes(HEADER.size),
+    HEADER.pack(MAGIC, VERSION + 1, 0, 0, 0, 0) + struct.pack('<I', 0),
+    # Claims one record but carries no record bytes
+    HEADER.pack(MAGIC, VERSION, 0, 1, 0, 0) + struct.pack('<I', 0),
+    # Claims a string longer than the payload
+    HEADER.pack(MAGIC, VERSION, 0, 0, 0, 0) + struct.pack('<IH', 1, 50) + b'abc',
+])
+def test_malformed_payloads_are_rejected(payload):
+    with pytest.raises(ProtocolError):
+        decode_sessions(payload)
+
+
+def test_out_of_range_string_reference_is_rejected():
+    payload = bytearray(encode_sessions([make_session()]))
+    offset = len(payload) - RECORD_DTYPE.itemsize + RECORD_DTYPE.fields['ip'][1]
+    payload[offset:offset + 4] = struct.pack('<i', 99)
+    with pytest.raises(ProtocolError):
+        decode_sessions(bytes(payload))
+
+
+def test_bad_json_alert_is_rejected():
+    payload = bytearray(encode_sessions([make_session(alert='{oops')]))
+    offset = len(payload) - RECORD_DTYPE.itemsize + RECORD_DTYPE.fields['flags'][1]
+    payload[offset] |= FLAG_ALERT_JSON
+    with pytest.raises(ProtocolError):
+        decode_sessions(bytes(payload))
+
+
+@pytest.mark.parametrize('accept, expected', [
+    (None, False),
+    ('*/*', False),
+    ('application/json', False),
+    (MIME_TYPE, True),
+    (f'{MIME_TYPE}, */*;q=0.1', True),
+    (f'application/json, {MIME_TYPE};q=0.5', False),
+])
+def test_accepts_binary(accept, expected):
+    headers = {'Accept': accept} if accept else {}
+    assert accepts_binary(Request(EnvironBuilder(headers=headers).get_environ())) is expected
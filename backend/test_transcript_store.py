@@ -0,0 +1,90 @@
+import os
+import sqlite3
+import time
+
+import pytest
+
+from transcript_store import SCHEMA, TranscriptStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return TranscriptStore(str(tmp_path))
+
+
+def today():
+    return time.strftime("%Y-%m-%d", time.gmtime())
+
+
+def texts(rows):
+    return [r["text"] for r in rows]
+
+
+def test_rows_are_routed_to_their_day(store):
+    store.insert_many("CNN", [("2025-01-01T23:59", "late"), ("2025-01-02T00:01", "early")])
+
+    partitions = store.partitions()
+    assert list(partitions) == ["2025-01-01", "2025-01-02"]
+    assert texts(store.range_query("CNN", "2025-01-02T00:00", "2025-01-02T23:59")) == ["early"]
+    assert texts(store.range_query("CNN", end_time="2025-01-01T23:59")) == ["late"]
+
+
+def test_range_query_is_newest_first_and_limited(store):
+    store.insert_many("CNN", [(f"2025-01-0{d}T12:00", f"day{d}") for d in range(1, 6)])
+    store.insert_many("NPR", [("2025-01-05T13:00", "other stream")])
+
+    assert texts(store.range_query("CNN")) == ["day5", "day4", "day3", "day2", "day1"]
+    assert texts(store.range_query("CNN", limit=2)) == ["day5", "day4"]
+    assert texts(store.range_query("CNN", "2025-01-02T00:00", "2025-01-03T23:59")) == ["day3", "day2"]
+
+
+def test_ids_survive_compaction_of_late_rows(store):
+    store.insert_many("CNN", [("2020-01-01T10:00", "a"), ("2020-01-01T11:00", "b")])
+    before = {r["text"]: r["id"] for r in store.range_query("CNN")}
+
+    store.compact()
+    files = store.partitions()["2020-01-01"]
+    assert files["db"] is None and files["gz"] is not None
+    assert {r["text"]: r["id"] for r in store.range_query("CNN")} == before
+
+    # A late row for the archived day must not reuse an archived id
+    store.insert_many("CNN", [("2020-01-01T12:00", "late")])
+    after_insert = {r["text"]: r["id"] for r in store.range_query("CNN")}
+    assert after_insert["late"] > max(before.values())
+
+    store.compact()
+    assert {r["text"]: r["id"] for r in store.range_query("CNN")} == after_insert
+    assert store.stream_names() == ["CNN"]
+
+
+def test_retention_drops_old_days(tmp_path):
+    store = TranscriptStore(str(tmp_path), retention_days=7)
+    store.insert_many("CNN", [("2020-01-01T10:00", "old"), (f"{today()}T10:00", "new")])
+    store.compact()
+
+    store.enforce_retention()
+
+    assert list(store.partitions()) == [today()]
+    assert texts(store.range_query("CNN")) == ["new"]
+
+
+def test_migrate_legacy_moves_rows_once(tmp_path):
+    conn = sqlite3.connect(os.path.join(tmp_path, "transcriptions.db"))
+    conn.execute(SCHEMA)
+    conn.executemany(
+        "INSERT INTO transcriptions (radio_stream, start_time, text) VALUES (?, ?, ?)",
+        [("CNN", f"2025-01-{d:02d}T10:00", f"day{d}") for d in range(1, 13)]
+    )
+    conn.commit()
+    conn.close()
+
+    store = TranscriptStore(str(tmp_path))
+    assert store.migrate_legacy() == 12
+    assert store.migrate_legacy() == 0
+    # Another process sharing the directory must not copy the rows again
+    assert TranscriptStore(str(tmp_path)).migrate_legacy() == 0
+
+    assert len(store.partitions()) == 12
+    assert texts(store.range_query("CNN")) == [f"day{d}" for d in range(12, 0, -1)]
+    with store.connect_recent() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM main.transcriptions").fetchone() == (0,)
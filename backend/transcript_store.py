@@ -0,0 +1,518 @@
+"""
+Day-partitioned storage for radio transcriptions.
+
+Transcripts are written to one SQLite file per UTC day under
+<base_dir>/transcriptions/, named transcriptions_YYYY-MM-DD.db. Range queries
+only open the partitions whose day overlaps the requested range. A background
+maintenance pass VACUUMs and gzips partitions older than compact_after_days
+and deletes partitions older than retention_days. Archived days are read
+through a small cache of decompressed copies, so repeated queries over the
+same days do not gunzip them again.
+
+Row ids are globally unique and never change: id = YYYYMMDD * 1_000_000 +
+rowid. Rows written for a day that has already been archived go to a fresh
+.db whose rowids start after the archive's highest id, and compaction keeps
+ids when it merges those rows into the archive.
+
+Writers, readers and maintenance coordinate through a file lock in the
+partition directory, so the listener and API processes can share it.
+"""
+import fcntl
+import gzip
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import quote
+
+PARTITION_PREFIX = "transcriptions_"
+ID_MULTIPLIER = 1000000
+# SQLite allows 10 attached databases by default
+MAX_ATTACHED = 9
+# Decompressed archive copies kept for reads
+CACHE_SIZE = 32
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transcriptions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    radio_stream TEXT,
+    start_time TEXT,
+    text TEXT
+    )
+"""
+INDEX = """
+CREATE INDEX IF NOT EXISTS idx_transcriptions_stream_time
+ON transcriptions (radio_stream, start_time)
+"""
+LISTENER_STATUS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS listener_status (
+    radio_stream TEXT PRIMARY KEY,
+    pending INTEGER,
+    in_flight INTEGER,
+    updated_at TEXT
+    )
+"""
+ARCHIVE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS archived_partitions (
+    day TEXT PRIMARY KEY,
+    max_id INTEGER,
+    streams TEXT
+    )
+"""
+MIGRATIONS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS migrations (
+    name TEXT PRIMARY KEY,
+    applied_at TEXT
+    )
+"""
+LEGACY_MIGRATION = "legacy_partitions"
+
+
+def _day_of(start_time):
+    """Partition key (YYYY-MM-DD) for a start_time like 2025-02-15T23:42"""
+    return start_time[:10]
+
+
+def _id_offset(day):
+    return int(day.replace("-", "")) * ID_MULTIPLIER
+
+
+def _today(offset_days=0):
+    return time.strftime("%Y-%m-%d", time.gmtime(time.time() - offset_days * 86400))
+
+
+def _ro_uri(path):
+    return f"file:{quote(os.path.abspath(path))}?mode=ro"
+
+
+def _remove_quietly(path):
+    """Remove a file that another reader may already have removed."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _connect_ro(path):
+    """Read-only connection; never creates an empty file for a missing path."""
+    return sqlite3.connect(_ro_uri(path), uri=True)
+
+
+class TranscriptStore:
+    def __init__(self, base_dir, retention_days=None, compact_after_days=2):
+        self.main_db = os.path.join(base_dir, "transcriptions.db")
+        self.partition_dir = os.path.join(base_dir, "transcriptions")
+        self.cache_dir = os.path.join(self.partition_dir, ".cache")
+        self.lock_path = os.path.join(self.partition_dir, ".lock")
+        self.retention_days = retention_days
+        self.compact_after_days = compact_after_days
+        self.lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @contextmanager
+    def _file_lock(self, shared=False):
+        """Cross-process lock: shared for reads, exclusive for writes and maintenance."""
+        with open(self.lock_path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _path(self, day, compressed=False):
+        name = f"{PARTITION_PREFIX}{day}.db"
+        return os.path.join(self.partition_dir, name + (".gz" if compressed else ""))
+
+    def partitions(self):
+        """Map each day to its files: {'YYYY-MM-DD': {'db': path|None, 'gz': path|None}}"""
+        result = {}
+        for name in os.listdir(self.partition_dir):
+            if not name.startswith(PARTITION_PREFIX):
+                continue
+            day = name[len(PARTITION_PREFIX):len(PARTITION_PREFIX) + 10]
+            if name.endswith(".db.gz"):
+                result.setdefault(day, {"db": None, "gz": None})["gz"] = os.path.join(self.partition_dir, name)
+            elif name.endswith(".db"):
+                result.setdefault(day, {"db": None, "gz": None})["db"] = os.path.join(self.partition_dir, name)
+        return dict(sorted(result.items()))
+
+    def _cached_copy(self, gz_path):
+        """Path of a decompressed copy of an archived partition, creating it if needed."""
+        day = os.path.basename(gz_path)[len(PARTITION_PREFIX):len(PARTITION_PREFIX) + 10]
+        cached = os.path.join(self.cache_dir, f"{day}.{os.stat(gz_path).st_mtime_ns}.db")
+        try:
+            os.utime(cached)
+            return cached
+        except FileNotFoundError:
+            pass
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as out, gzip.open(gz_path, "rb") as src:
+            shutil.copyfileobj(src, out)
+        os.replace(tmp_path, cached)
+        self._evict_cache()
+        return cached
+
+    def _evict_cache(self):
+        """Drop copies of archives that changed or were deleted, then the least recently used."""
+        partitions = self.partitions()
+        live = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if not name.endswith(".db"):
+                continue
+            day, mtime_ns = name.split(".")[:2]
+            gz_path = partitions.get(day, {}).get("gz")
+            try:
+                if gz_path is None or str(os.stat(gz_path).st_mtime_ns) != mtime_ns:
+                    os.remove(path)
+                else:
+                    live.append((os.stat(path).st_mtime, path))
+            except FileNotFoundError:
+                continue
+        for _, path in sorted(live, reverse=True)[CACHE_SIZE:]:
+            _remove_quietly(path)
+
+    def _archive_info(self, conn, day):
+        """(max_id, streams) recorded when the day was archived, or None."""
+        conn.execute(ARCHIVE_SCHEMA)
+        row = conn.execute("SELECT max_id, streams FROM archived_partitions WHERE day = ?", (day,)).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+    def insert_many(self, radio_stream, rows):
+        """Insert (start_time, text) rows, routing each to its day's partition."""
+        by_day = {}
+        for start_time, text in rows:
+            by_day.setdefault(_day_of(start_time), []).append((radio_stream, start_time, text))
+
+        with self._file_lock():
+            for day, day_rows in by_day.items():
+                conn = sqlite3.connect(self._prepare_partition(day))
+                try:
+                    conn.executemany("""
+                    INSERT INTO transcriptions (radio_stream, start_time, text)
+                    VALUES (?, ?, ?)
+                    """, day_rows)
+                    conn.commit()
+                finally:
+                    conn.close()
+
+    def _prepare_partition(self, day):
+        """
+        Path of the day's writable .db, creating it if needed. Caller holds the
+        exclusive file lock.
+        """
+        path = self._path(day)
+        seed = None
+        if not os.path.exists(path) and os.path.exists(self._path(day, compressed=True)):
+            # Late rows for an archived day: continue after the archive's ids
+            seed = self._archived_max_id(day)
+
+        conn = sqlite3.connect(path)
+        try:
+            conn.execute(SCHEMA)
+            conn.execute(INDEX)
+            if seed is not None:
+                conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('transcriptions', ?)", (seed,))
+            conn.commit()
+        finally:
+            conn.close()
+        return path
+
+    def _archived_max_id(self, day):
+        conn = sqlite3.connect(self.main_db)
+        try:
+            info = self._archive_info(conn, day)
+        finally:
+            conn.close()
+        if info is not None:
+            return info[0]
+        archive = _connect_ro(self._cached_copy(self._path(day, compressed=True)))
+        try:
+            return archive.execute("SELECT COALESCE(MAX(id), 0) FROM transcriptions").fetchone()[0]
+        finally:
+            archive.close()
+
+    def range_query(self, radio_stream, start_time=None, end_time=None, limit=None):
+        """
+        Transcriptions for radio_stream with start_time in [start_time, end_time]
+        (either bound optional), newest first, at most limit rows. Only
+        overlapping partitions are read, newest day first.
+        """
+        sql = "SELECT id, radio_stream, start_time, text FROM transcriptions WHERE radio_stream = ?"
+        params = [radio_stream]
+        if start_time:
+            sql += " AND start_time >= ?"
+            params.append(start_time)
+        if end_time:
+            sql += " AND start_time <= ?"
+            params.append(end_time)
+        sql += " ORDER BY id DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+
+        results = []
+        with self._file_lock(shared=True):
+            for day, files in reversed(self.partitions().items()):
+                if end_time and day > _day_of(end_time):
+                    continue
+                if start_time and day < _day_of(start_time):
+                    break
+                offset = _id_offset(day)
+                # Late rows in the .db always have higher ids than the archive
+                for kind in ("db", "gz"):
+                    if files[kind] is None:
+                        continue
+                    remaining = None if limit is None else limit - len(results)
+                    if remaining == 0:
+                        return results
+                    path = files[kind] if kind == "db" else self._cached_copy(files[kind])
+                    conn = _connect_ro(path)
+                    try:
+                        rows = conn.execute(sql, params + ([remaining] if limit is not None else []))
+                        for row_id, stream, row_time, text in rows:
+                            results.append({
+                                "id": offset + row_id,
+                                "radio_stream": stream,
+                                "start_time": row_time,
+                                "text": text,
+                            })
+                    finally:
+                        conn.close()
+        return results
+
+    def stream_names(self):
+        """Every radio stream with transcripts in any partition, archived or not."""
+        streams = set()
+        main = sqlite3.connect(self.main_db)
+        try:
+            with self._file_lock(shared=True):
+                for day, files in self.partitions().items():
+                    paths = [files["db"]]
+                    info = self._archive_info(main, day) if files["gz"] else None
+                    if info is not None:
+                        streams.update(info[1])
+                    elif files["gz"]:
+                        paths.append(self._cached_copy(files["gz"]))
+                    for path in filter(None, paths):
+                        conn = _connect_ro(path)
+                        try:
+                            streams.update(r[0] for r in conn.execute("SELECT DISTINCT radio_stream FROM transcriptions"))
+                        finally:
+                            conn.close()
+        finally:
+            main.close()
+        return sorted(s for s in streams if s is not None)
+
+    @contextmanager
+    def connect_recent(self):
+        """
+        Connection to the main database with the most recent uncompressed
+        partitions attached and a TEMP VIEW named 'transcriptions' over them,
+        so ad-hoc SQL written against the old single table keeps working.
+        Archived days are not included; use range_query or stream_names.
+        """
+        with self._file_lock(shared=True):
+            conn = sqlite3.connect(self.main_db)
+            try:
+                conn.execute(SCHEMA)
+                hot = [(day, f["db"]) for day, f in self.partitions().items() if f["db"]][-MAX_ATTACHED:]
+                selects = ["SELECT id, radio_stream, start_time, text FROM main.transcriptions"]
+                for i, (day, path) in enumerate(hot):
+                    conn.execute(f"ATTACH DATABASE ? AS p{i}", (_ro_uri(path),))
+                    selects.append(
+                        f"SELECT {_id_offset(day)} + id AS id, radio_stream, start_time, text FROM p{i}.transcriptions"
+                    )
+                conn.execute("CREATE TEMP VIEW transcriptions AS " + " UNION ALL ".join(selects))
+                yield conn
+            finally:
+                conn.close()
+
+    def report_backlog(self, radio_stream, pending, in_flight):
+        """Called by the radio listener to publish its backlog depth."""
+        conn = sqlite3.connect(self.main_db)
+        try:
+            conn.execute(LISTENER_STATUS_SCHEMA)
+            conn.execute("""
+            INSERT OR REPLACE INTO listener_status (radio_stream, pending, in_flight, updated_at)
+            VALUES (?, ?, ?, ?)
+            """, (radio_stream, pending, in_flight, time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime())))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def listener_backlog(self):
+        """Backlog per stream as last reported by the listener: {(stream, state): count}"""
+        conn = sqlite3.connect(self.main_db)
+        try:
+            conn.execute(LISTENER_STATUS_SCHEMA)
+            rows = conn.execute("SELECT radio_stream, pending, in_flight FROM listener_status").fetchall()
+        finally:
+            conn.close()
+        backlog = {}
+        for stream, pending, in_flight in rows:
+            backlog[(stream, "pending")] = pending
+            backlog[(stream, "in_flight")] = in_flight
+        return backlog
+
+    def migrate_legacy(self):
+        """
+        Move rows from the old single-table transcriptions.db into partitions
+        and return how many moved. Runs once: later calls, e.g. from other
+        wsgi workers, see the recorded migration and return 0.
+        """
+        with self._file_lock():
+            conn = sqlite3.connect(self.main_db)
+            try:
+                conn.execute(SCHEMA)
+                conn.execute(MIGRATIONS_SCHEMA)
+                if conn.execute("SELECT 1 FROM migrations WHERE name = ?", (LEGACY_MIGRATION,)).fetchone():
+                    return 0
+
+                days = [r[0] for r in conn.execute(
+                    "SELECT DISTINCT substr(start_time, 1, 10) FROM transcriptions ORDER BY 1"
+                )]
+                moved = 0
+                for i in range(0, len(days), MAX_ATTACHED):
+                    batch = days[i:i + MAX_ATTACHED]
+                    for j, day in enumerate(batch):
+                        conn.execute(f"ATTACH DATABASE ? AS p{j}", (self._prepare_partition(day),))
+                    # Copy and delete in one transaction across the attached
+                    # files, so an interrupted run never leaves rows in both
+                    with conn:
+                        for j, day in enumerate(batch):
+                            moved += conn.execute(f"""
+                            INSERT INTO p{j}.transcriptions (radio_stream, start_time, text)
+                            SELECT radio_stream, start_time, text FROM main.transcriptions
+                            WHERE substr(start_time, 1, 10) = ? ORDER BY id
+                            """, (day,)).rowcount
+                            conn.execute("DELETE FROM main.transcriptions WHERE substr(start_time, 1, 10) = ?", (day,))
+                    for j in range(len(batch)):
+                        conn.execute(f"DETACH DATABASE p{j}")
+
+                conn.execute(
+                    "INSERT INTO migrations (name, applied_at) VALUES (?, ?)",
+                    (LEGACY_MIGRATION, time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime()))
+                )
+                conn.commit()
+                return moved
+            finally:
+                conn.close()
+
+    def compact(self):
+        """VACUUM and gzip partitions older than compact_after_days."""
+        cutoff = _today(self.compact_after_days)
+        for day, files in self.partitions().items():
+            if day < cutoff and files["db"] is not None:
+                with self._file_lock():
+                    self._compact_day(day)
+
+    def _compact_day(self, day):
+        """Fold a day's .db into its archive. Caller holds the exclusive file lock."""
+        db_path = self._path(day)
+        gz_path = self._path(day, compressed=True)
+        if not os.path.exists(db_path):
+            return
+
+        fd, work_path = tempfile.mkstemp(dir=self.partition_dir, suffix=".compacting")
+        os.close(fd)
+        try:
+            if os.path.exists(gz_path):
+                with gzip.open(gz_path, "rb") as src, open(work_path, "wb") as out:
+                    shutil.copyfileobj(src, out)
+                conn = sqlite3.connect(work_path)
+                # Keep ids; OR IGNORE makes a retry after an interrupted pass harmless
+                conn.execute("ATTACH DATABASE ? AS late", (_ro_uri(db_path),))
+                conn.execute("""
+                INSERT OR IGNORE INTO transcriptions (id, radio_stream, start_time, text)
+                SELECT id, radio_stream, start_time, text FROM late.transcriptions
+                """)
+                conn.commit()
+                conn.execute("DETACH DATABASE late")
+            else:
+                shutil.copyfile(db_path, work_path)
+                conn = sqlite3.connect(work_path)
+            try:
+                conn.execute("VACUUM")
+                max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM transcriptions").fetchone()[0]
+                streams = [r[0] for r in conn.execute("SELECT DISTINCT radio_stream FROM transcriptions")]
+            finally:
+                conn.close()
+
+            tmp_gz = gz_path + ".tmp"
+            with open(work_path, "rb") as src, gzip.open(tmp_gz, "wb") as out:
+                shutil.copyfileobj(src, out)
+            os.replace(tmp_gz, gz_path)
+
+            main = sqlite3.connect(self.main_db)
+            try:
+                main.execute(ARCHIVE_SCHEMA)
+                main.execute(
+                    "INSERT OR REPLACE INTO archived_partitions (day, max_id, streams) VALUES (?, ?, ?)",
+                    (day, max_id, json.dumps(streams))
+                )
+                main.commit()
+            finally:
+                main.close()
+            os.remove(db_path)
+        finally:
+            os.remove(work_path)
+
+    def enforce_retention(self):
+        """Delete partitions older than retention_days (no-op if unset)."""
+        if not self.retention_days:
+            return
+        cutoff = _today(self.retention_days)
+        with self._file_lock():
+            partitions = self.partitions()
+            expired = [day for day in partitions if day < cutoff]
+            for day in expired:
+                for path in partitions[day].values():
+                    if path:
+                        os.remove(path)
+            if expired:
+                main = sqlite3.connect(self.main_db)
+                try:
+                    main.execute(ARCHIVE_SCHEMA)
+                    main.executemany("DELETE FROM archived_partitions WHERE day = ?", [(d,) for d in expired])
+                    main.commit()
+                finally:
+                    main.close()
+                self._evict_cache()
+
+    def run_maintenance(self):
+        with self.lock:
+            self.enforce_retention()
+            self.compact()
+
+    def start_maintenance(self, interval=3600):
+        """Run retention and compaction on a daemon thread every interval seconds."""
+        def loop():
+            while True:
+                try:
+                    self.run_maintenance()
+                except Exception as e:
+                    print(f"Error in transcript maintenance: {e}")
+                time.sleep(interval)
+
+        thread = threading.Thread(target=loop, daemon=True)
+        thread.start()
+        return thread
+
+
+if __name__ == "__main__":
+    # USAGE: python transcript_store.py --base_dir backend [--retention_days 30]
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--base_dir", default=os.path.dirname(os.path.abspath(__file__)))
+    parser.add_argument("--retention_days", type=int)
+    parser.add_argument("--compact_after_days", type=int, default=2)
+    args = parser.parse_args()
+
+    store = TranscriptStore(args.base_dir, args.retention_days, args.compact_after_days)
+    print(f"Migrated {store.migrate_legacy()} legacy rows")
+    store.run_maintenance()
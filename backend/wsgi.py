@@ -1,5 +1,7 @@
 # wsgi.py
-from app import app
+from app import app, init_transcription_db
+
+init_transcription_db()
 
 if __name__ == "__main__":
     app.run()
@@ -25,10 +25,9 @@ const HeadRadio: React.FC = () => {
   useEffect(() => {
     const fetchTranscriptions = async () => {
       try {
-        const sqlQuery = encodeURIComponent(
-          "SELECT * FROM transcriptions WHERE radio_stream = 'CNN' ORDER BY id DESC LIMIT 1000"
-        );
-        const response = await axios.get(`${API_BASE_URL}/query?query=${sqlQuery}`);
+        const response = await axios.get(`${API_BASE_URL}/range_transcriptions`, {
+          params: { radio_stream: 'CNN', limit: 1000 }
+        });
         setTranscriptions(response.data);
       } catch (err: any) {
         console.error("Error fetching data:", err);
@@ -18,6 +18,9 @@ const API_BASE_URL = process.env.NODE_ENV === 'production'
   ? 'https://protest.morelos.dev'
   : 'http://localhost:5001';
 
+// Rows loaded when no time range is selected
+const DEFAULT_LIMIT = 1000;
+
 async function getSentiment(radioStream: string): Promise<SentimentResult> {
   try {
     if (!radioStream) return {label: "empty input!", score: 0};
@@ -51,10 +54,8 @@ const Radio: React.FC = () => {
   useEffect(() => {
     const fetchSources = async () => {
       try {
-        const sqlForDistinct = encodeURIComponent("SELECT DISTINCT radio_stream FROM transcriptions");
-        const response = await axios.get(`${API_BASE_URL}/query?query=${sqlForDistinct}`);
-        const data = response.data;
-        const distinctSources = data.map((row: any) => row.radio_stream);
+        const response = await axios.get(`${API_BASE_URL}/radio_streams`);
+        const distinctSources: string[] = response.data;
         setSources(distinctSources);
         if (distinctSources.length > 0) {
           setSelectedSource(distinctSources[0]);
@@ -76,6 +77,8 @@ const Radio: React.FC = () => {
       const utcEnd = localToUTCString(endTime);
       if (startTime) params.start_time = utcStart;
       if (endTime) params.end_time = utcEnd;
+      // Without a range, only load the most recent rows rather than every archived day
+      if (!startTime && !endTime) params.limit = DEFAULT_LIMIT;
       const response = await axios.get(`${API_BASE_URL}/range_transcriptions`, { params });
       setTranscriptions(response.data);
     } catch (err: any) {
@@ -6,12 +6,20 @@ from datetime import datetime
 import sys
 import whisper
 import threading
-import sqlite3
 import argparse
+import queue
+from concurrent.futures import ThreadPoolExecutor, wait
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from transcript_store import TranscriptStore
 
 # A global lock to help with any directory access if needed
 directory_lock = threading.Lock()
 
+# Segment filenames embed their recording start time, e.g. output_20250101_120000.wav
+SEGMENT_PREFIX = "output_"
+SEGMENT_TIME_FORMAT = "%Y%m%d_%H%M%S"
+
 def get_station(stream_search_url, params):
     response = requests.get(stream_search_url, params=params)
     print(response)
@@ -28,8 +36,8 @@ def record_stream(audio_store, stream_url, duration="120"):
     try:
         while True:
             # Create a unique filename based on the current timestamp
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            output_file = os.path.join(audio_store, f"output_{timestamp}.wav")
+            timestamp = datetime.now().strftime(SEGMENT_TIME_FORMAT)
+            output_file = os.path.join(audio_store, f"{SEGMENT_PREFIX}{timestamp}.wav")
 
             # Build the FFmpeg command
             ffmpeg_command = [
@@ -48,54 +56,130 @@ def record_stream(audio_store, stream_url, duration="120"):
         print(f"Error: {e}")
         sys.exit(1)
 
-def transcribe_stream(audio_store, stream_name, model, segment_duration):
+# Per-stream backlog counters, also reported to the API's /metrics via TranscriptStore
+backlog_depth = {}
+
+
+def segment_start_time(path):
     """
-    Continuously looks for the earliest audio file in 'audio_store', transcribes it using Whisper,
-    and writes the transcription (with timestamps for each segment) to a text file.
+    Epoch seconds at which a segment started recording, parsed from the
+    timestamp record_stream embeds in the filename. Falls back to the file's
+    mtime if the name does not carry a timestamp.
     """
+    name = os.path.splitext(os.path.basename(path))[0]
     try:
-        conn = sqlite3.connect("../backend/transcriptions.db")
-        db = conn.cursor()
+        return datetime.strptime(name[len(SEGMENT_PREFIX):], SEGMENT_TIME_FORMAT).timestamp()
+    except ValueError:
+        return os.path.getmtime(path)
+
+
+def list_ready_segments(audio_store, segment_duration):
+    """
+    Return the sorted list of .wav paths that can be transcribed. A segment is
+    ready once a later segment exists (record_stream has moved on) or it has not
+    been modified for segment_duration seconds; the one still being recorded is
+    left out.
+    """
+    with directory_lock:
+        entries = sorted(
+            (e for e in os.scandir(audio_store) if e.name.endswith('.wav')),
+            key=lambda e: e.name
+        )
+    now = time.time()
+    ready = []
+    for i, entry in enumerate(entries):
+        is_last = i == len(entries) - 1
+        if not is_last or now - entry.stat().st_mtime >= int(segment_duration):
+            ready.append(entry.path)
+    return ready
 
-        while True:
-            # List all .wav files in the audio_store
-            with directory_lock:
-                files = [f for f in os.listdir(audio_store) if f.endswith('.wav')]
-            
-            if not files:
-                time.sleep(1)
-                continue
-
-            # Sort files by filename (which embeds the timestamp) to get the earliest one
-            files.sort()
-            earliest_file = files[0]
-            full_path = os.path.join(audio_store, earliest_file)
-
-            # Check that the file is not "fresh" (i.e. still being written)
-            if time.time() - os.path.getmtime(full_path) < int(segment_duration):
-                # File is too new; wait a little and try again
-                time.sleep(5)
-                continue
-
-            print(f"Transcribing {full_path} ...")
-            result = model.transcribe(full_path)
-
-            # Create a transcription text file with the same base filename
-            start_time = time.time()
-            for segment in result.get("segments", []):
-                start_sec = segment["start"]
-                text = segment["text"].strip()
-                cur_time = start_time + start_sec 
-                start_time_str = time.strftime('%Y-%m-%dT%H:%M', time.gmtime(cur_time))
-                db.execute("""
-                INSERT INTO transcriptions (radio_stream, start_time, text)
-                VALUES (?, ?, ?)
-                """, (stream_name, start_time_str, text))
-                conn.commit()
-
-            # After processing, remove the audio file
-            with directory_lock:
-                os.remove(full_path)
+
+def update_backlog(store, stream_name, pending, in_flight):
+    """Record backlog depth, only touching the database when it changes."""
+    depth = {"pending": pending, "in_flight": in_flight}
+    if backlog_depth.get(stream_name) == depth:
+        return
+    backlog_depth[stream_name] = depth
+    store.report_backlog(stream_name, pending, in_flight)
+
+
+def transcribe_stream(audio_store, stream_name, model, segment_duration, workers=1, poll_interval=1):
+    """
+    Continuously drains the audio segments in 'audio_store'. Ready segments are
+    transcribed by up to 'workers' threads in parallel and their transcriptions
+    are written to the database strictly in segment order, each timestamped
+    from the segment's own start time.
+
+    'model' may be a single Whisper model or a list of models; each worker
+    borrows one model at a time, so pass one model per worker to get real
+    parallelism.
+    """
+    models = queue.Queue()
+    for m in (model if isinstance(model, (list, tuple)) else [model]):
+        models.put(m)
+
+    def run_model(path):
+        m = models.get()
+        try:
+            return m.transcribe(path)
+        finally:
+            models.put(m)
+
+    try:
+        store = TranscriptStore("../backend")
+
+        # Segments dispatched to workers, keyed and committed in filename order
+        in_flight = {}
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while True:
+                ready = list_ready_segments(audio_store, segment_duration)
+                for path in ready:
+                    if path not in in_flight and len(in_flight) < workers * 2:
+                        print(f"Transcribing {path} ...")
+                        in_flight[path] = pool.submit(run_model, path)
+
+                # Commit finished segments in order; stop at the first one still running
+                committed = set()
+                for path in sorted(in_flight):
+                    future = in_flight[path]
+                    if not future.done():
+                        break
+                    del in_flight[path]
+                    committed.add(path)
+
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        print(f"Error transcribing {path}: {e}")
+                        with directory_lock:
+                            os.rename(path, path + ".failed")
+                        continue
+
+                    start_time = segment_start_time(path)
+                    rows = []
+                    for segment in result.get("segments", []):
+                        start_sec = segment["start"]
+                        text = segment["text"].strip()
+                        cur_time = start_time + start_sec
+                        start_time_str = time.strftime('%Y-%m-%dT%H:%M', time.gmtime(cur_time))
+                        rows.append((start_time_str, text))
+                    # Rows go to the day partition matching their start time
+                    store.insert_many(stream_name, rows)
+
+                    # After processing, remove the audio file
+                    with directory_lock:
+                        os.remove(path)
+
+                # Pending means ready but not yet handed to a worker, so the
+                # states never overlap and the recording segment is not counted
+                pending = sum(1 for path in ready if path not in in_flight and path not in committed)
+                update_backlog(store, stream_name, pending, len(in_flight))
+                if in_flight:
+                    # Later segments finishing first cannot be committed yet,
+                    # so only the oldest one can unblock progress
+                    wait([in_flight[min(in_flight)]], timeout=poll_interval)
+                else:
+                    time.sleep(poll_interval)
 
     except KeyboardInterrupt:
         print("User pressed Ctrl+C. Exiting continuous transcription.")
@@ -104,7 +188,7 @@ def transcribe_stream(audio_store, stream_name, model, segment_duration):
         print(f"Error: {e}")
         sys.exit(1)
 
-def init_stream_process(stream_name, stream_url, model):
+def init_stream_process(stream_name, stream_url, model, workers=1):
     """
     Initialize the recording and transcription threads for a given stream.
     """
@@ -123,7 +207,7 @@ def init_stream_process(stream_name, stream_url, model):
     )
     transcribe_thread = threading.Thread(
         target=transcribe_stream, 
-        args=(audio_store, stream_name, model, segment_duration),
+        args=(audio_store, stream_name, model, segment_duration, workers),
         daemon=True
     )
 
@@ -140,24 +224,12 @@ if __name__ == "__main__":
     parser.add_argument("--stream_name", help="Name of the radio stream")
     parser.add_argument("--stream_url", help="URL of the radio stream")
     parser.add_argument("--model_type", help="Type of the model to use")
+    parser.add_argument("--workers", type=int, default=1, help="Number of parallel transcription workers")
     args = parser.parse_args()
 
-    model = whisper.load_model(args.model_type)
-
-    # create SQLite database if it doesn't exist
-    db_file = "../backend/transcriptions.db"
-    conn = sqlite3.connect(db_file)
-    cursor = conn.cursor()
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS transcriptions (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        radio_stream TEXT,
-        start_time TEXT,
-        text TEXT
-        )
-    """)
-    conn.commit()
+    # One model per worker so transcriptions can run in parallel
+    models = [whisper.load_model(args.model_type) for _ in range(args.workers)]
 
     # stream_search_url = "https://de1.api.radio-browser.info/json/stations"
 
-    init_stream_process(args.stream_name, args.stream_url, model)
\ No newline at end of file
+    init_stream_process(args.stream_name, args.stream_url, models, args.workers)
\ No newline at end of file